@@ -1,13 +1,20 @@
 import streamlit as st
-import cv2
 import numpy as np
-import face_recognition
 import os
-import pandas as pd
 from datetime import datetime
 import tempfile
 import shutil
 import glob
+import csv
+import hashlib
+import io
+import platform
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+# cv2, dlib and pandas are heavy to load, so they are imported only where they are
+# used. The page can paint before they have loaded. face_recognition is only ever
+# loaded by the face worker process (face_worker.py).
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="AI Attendance System", layout="centered", page_icon="📍")
@@ -15,6 +22,14 @@ st.set_page_config(page_title="AI Attendance System", layout="centered", page_ic
 # --- STORAGE SETUP ---
 DEFAULT_IMG_FOLDER = 'Images_Attendance'
 DEFAULT_CSV_FILE = 'attendance_log.csv'
+CSV_HEADER = 'Name,Time,Date\n'
+ENC_CACHE_FILE = '.enc_cache.npz' # Face encodings cache, lives inside the image folder
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+MATCH_TOLERANCE = 0.5 # Max face distance that still counts as the same person
+CHECKIN_MAX_WIDTH = 640 # Check-in photos are shrunk to this width before face detection
+REGISTER_MAX_WIDTH = 800 # Registration photos are stored at most this wide
+FACE_CACHE_SIZE = 32 # Check-in photos per session whose faces are remembered across reruns
+LOG_VIEW_ROWS = 500 # View Logs shows only the most recent check-ins
 
 @st.cache_resource
 def setup_storage():
@@ -44,7 +59,7 @@ def setup_storage():
         # Check CSV
         if not os.path.exists(DEFAULT_CSV_FILE):
              with open(DEFAULT_CSV_FILE, 'w') as f:
-                 f.write('')
+                 f.write(CSV_HEADER)
                  
     except OSError:
         # READ-ONLY: Switch to Temp
@@ -70,56 +85,272 @@ def setup_storage():
 
 IMG_FOLDER, CSV_FILE, IS_TEMP_STORAGE, COPIED_COUNT = setup_storage()
 
-# Ensure CSV
-if not os.path.exists(CSV_FILE):
+# Ensure CSV (an empty file has no header either)
+if not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0:
     try:
-        pd.DataFrame(columns=['Name', 'Time', 'Date']).to_csv(CSV_FILE, index=False)
+        with open(CSV_FILE, 'w') as f:
+            f.write(CSV_HEADER)
     except:
         pass
 
 # --- HELPER FUNCTIONS ---
 
-@st.cache_data
+def dlib_lacks_avx():
+    """
+    True if this is an x86 machine and dlib was compiled without AVX.
+    Such builds run the face encoder several times slower.
+    """
+    if platform.machine().lower() not in ('x86_64', 'amd64', 'i386', 'i686'):
+        return False
+    import dlib
+    use_avx = getattr(dlib, 'USE_AVX_INSTRUCTIONS', None)
+    return use_avx is False
+
+def _load_cache():
+    """
+    Reads the on-disk encoding cache as {filename: (mtime, encoding)}.
+    The encoding is None for images where no face was found (stored as a NaN row).
+    A missing or unreadable cache just means everything gets re-encoded.
+    """
+    path = os.path.join(IMG_FOLDER, ENC_CACHE_FILE)
+    try:
+        with np.load(path) as data:
+            return {
+                str(name): (float(mtime), None if np.isnan(enc[0]) else enc)
+                for name, mtime, enc in zip(data['names'], data['mtimes'], data['encs'])
+            }
+    except Exception:
+        return {}
+
+def _save_cache(cache):
+    """
+    Writes the encoding cache next to the images.
+    Goes through a temp file + rename so a crash never leaves a half-written cache.
+    """
+    path = os.path.join(IMG_FOLDER, ENC_CACHE_FILE)
+    tmp_path = path + '.tmp'
+    names = sorted(cache)
+    no_face = np.full(128, np.nan, dtype=np.float32)
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                names=np.array(names, dtype=str),
+                mtimes=np.array([cache[n][0] for n in names], dtype=np.float64),
+                encs=np.array([no_face if cache[n][1] is None else cache[n][1] for n in names],
+                              dtype=np.float32).reshape(-1, 128),
+            )
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def _decode_one(path):
+    """Reads and shrinks the image at `path` (BGR), or returns None if it can't be decoded."""
+    try:
+        # OpenCV applies the EXIF orientation, so sideways phone photos come out upright
+        with open(path, 'rb') as f:
+            return decode_image(f.read(), REGISTER_MAX_WIDTH)
+    except Exception:
+        return None
+
+@st.cache_resource
+def _face_pool():
+    """
+    One worker process that runs all face detection and encoding (see face_worker.py).
+    dlib holds the GIL while it works, so doing it here would stall every session.
+    While a script thread waits for the worker, other sessions keep running.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import face_worker
+
+    # "spawn" starts a clean interpreter instead of forking the running Streamlit server
+    return ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=face_worker.init_worker,
+    )
+
+def run_in_worker(fn, *args):
+    """Runs fn(*args) in the face worker process and returns its result."""
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        return _face_pool().submit(fn, *args).result()
+    except BrokenProcessPool:
+        # The worker died (e.g. out of memory): start a fresh one next time
+        _face_pool.clear()
+        raise
+
+@st.cache_resource
 def load_registered_faces():
-    known_encodings = []
-    known_names = []
-    
+    """
+    Returns (encodings, sqnorms, names) where encodings is a float32 (N, 128) array
+    and sqnorms holds each row's squared length for find_best_match.
+    """
+    # Only images that are new or changed since the last run go through the CNN.
+    cache = _load_cache()
+    fresh = {}
+    dirty = False
+    entries = []
+
     if os.path.exists(IMG_FOLDER):
-        files = [f for f in os.listdir(IMG_FOLDER) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
-        for file in files:
-            path = os.path.join(IMG_FOLDER, file)
-            try:
-                img = face_recognition.load_image_file(path)
-                encodings = face_recognition.face_encodings(img)
-                if encodings:
-                    known_encodings.append(encodings[0])
-                    name = os.path.splitext(file)[0].replace('_', ' ')
-                    known_names.append(name)
-            except Exception:
-                pass
-    return known_encodings, known_names
+        with os.scandir(IMG_FOLDER) as it:
+            entries = sorted(
+                (e for e in it if e.is_file() and e.name.lower().endswith(IMAGE_EXTS)),
+                key=lambda e: e.name,
+            )
 
-def mark_attendance(name):
+    stale = []
+    for entry in entries:
+        mtime = entry.stat().st_mtime
+        cached = cache.get(entry.name)
+        if cached is not None and cached[0] == mtime:
+            fresh[entry.name] = cached
+        else:
+            stale.append((entry.name, entry.path, mtime))
+
+    # Files are read and decoded in parallel, and each decoded image is handed to the
+    # face worker as soon as it is ready. The worker encodes one image at a time:
+    # face_recognition shares one detector and one network, which are not safe to run
+    # from several threads at once. Decoding goes in small batches so only a few
+    # decoded images are held in memory at a time.
+    if stale:
+        import face_worker
+        workers = os.cpu_count() or 1
+        paths = [path for _, path, _ in stale]
+        encodings = []
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for start in range(0, len(paths), 2 * workers):
+                batch = ex.map(_decode_one, paths[start:start + 2 * workers])
+                encodings.extend(run_in_worker(face_worker.encode_first_face, img) for img in batch)
+        # Images without a face are cached too (as None), so they aren't retried every start
+        for (filename, _, mtime), encoding in zip(stale, encodings):
+            fresh[filename] = (mtime, encoding)
+        dirty = True
+        fresh = dict(sorted(fresh.items()))
+
+    # Deleted images also need to drop out of the cache
+    if dirty or len(fresh) != len(cache):
+        _save_cache(fresh)
+
+    faces = [(f, enc) for f, (_, enc) in fresh.items() if enc is not None]
+    known_names = [os.path.splitext(f)[0].replace('_', ' ') for f, _ in faces]
+    known_encodings = np.array([enc for _, enc in faces], dtype=np.float32).reshape(-1, 128)
+    known_sqnorms = (known_encodings * known_encodings).sum(axis=1)
+    # Cached as a shared resource (no copy per rerun), so guard against accidental writes
+    known_encodings.flags.writeable = False
+    known_sqnorms.flags.writeable = False
+    return known_encodings, known_sqnorms, known_names
+
+def find_best_match(known_encodings, known_sqnorms, encoding):
+    """
+    Finds the registered face closest to `encoding`.
+    Returns (index, squared distance). Uses |k-q|^2 = |k|^2 + |q|^2 - 2k.q so the
+    whole database is compared in a single matrix-vector product.
+    """
+    q = np.asarray(encoding, dtype=np.float32)
+
+    # |q|^2 is the same for every row, so it is only added to the winner.
+    # The rest is done in place on the dot-product output: one buffer, no temporaries.
+    d2 = known_encodings.dot(q)
+    d2 *= -2.0
+    d2 += known_sqnorms
+    idx = int(d2.argmin())
+    return idx, float(d2[idx] + q.dot(q))
+
+def decode_image(img_bytes, max_width):
+    """
+    Decodes photo bytes into a BGR image no wider than `max_width`.
+    JPEGs are decoded directly at 1/2, 1/4 or 1/8 scale whenever that still leaves
+    `max_width` pixels, which is much cheaper than a full decode and a resize.
+    """
+    import cv2
+    from image_utils import reduced_read_flag
+
+    flag = reduced_read_flag(io.BytesIO(img_bytes), max_width)
+    img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), flag)
+    h, w = img.shape[:2]
+    if w > max_width:
+        scale = max_width / w
+        img = cv2.resize(img, (max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+@st.cache_resource
+def _attendance_index():
+    """
+    Returns (seen, lock): the set of (name, date) pairs already in the log, read once
+    per process, and the lock sessions hold while checking and adding to it.
+    mark_attendance adds to the set as it appends, so the CSV is never re-read.
+    """
+    seen = set()
     try:
-        df = pd.read_csv(CSV_FILE)
-    except:
-        df = pd.DataFrame(columns=['Name', 'Time', 'Date'])
+        with open(CSV_FILE, newline='') as f:
+            for row in csv.reader(f):
+                if len(row) >= 3:
+                    seen.add((row[0], row[2]))
+    except OSError:
+        pass
+    return seen, threading.Lock()
+
+def analyze_faces(img_bytes, rgb_img):
+    """
+    Returns (face_locations, face_encodings) for a check-in photo.
+    Streamlit re-runs the page on every interaction and hands us the same photo
+    again, so results are kept per session keyed by the photo's hash.
+    """
+    import face_worker
 
+    cache = st.session_state.setdefault("face_cache", OrderedDict())
+    key = hashlib.sha1(img_bytes).digest()
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    face_locations, face_encodings = run_in_worker(face_worker.analyze_faces, rgb_img)
+    cache[key] = (face_locations, face_encodings)
+    if len(cache) > FACE_CACHE_SIZE:
+        cache.popitem(last=False)
+    return face_locations, face_encodings
+
+@st.cache_data(max_entries=4)
+def read_recent_logs(max_rows, file_stamp):
+    """
+    Returns (header, rows) with only the last `max_rows` rows of the attendance log.
+    The file is streamed line by line, so only those rows are ever held in memory.
+    `file_stamp` is the log's (mtime, size): reruns re-use the parsed rows until
+    a new check-in changes the file.
+    """
+    with open(CSV_FILE, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        rows = deque((row for row in reader if header and len(row) == len(header)), maxlen=max_rows)
+    return header, list(rows)
+
+def mark_attendance(name):
     now = datetime.now()
     today_date = now.strftime('%Y-%m-%d')
     current_time = now.strftime('%H:%M:%S')
 
-    if not df.empty:
-        already_present = df[(df['Name'] == name) & (df['Date'] == today_date)]
-        if not already_present.empty:
+    row = io.StringIO()
+    csv.writer(row, lineterminator='\n').writerow([name, current_time, today_date])
+
+    seen, lock = _attendance_index()
+    with lock:
+        if (name, today_date) in seen:
             return False, "Already checked in today!"
 
-    new_entry = pd.DataFrame({'Name': [name], 'Time': [current_time], 'Date': [today_date]})
-    try:
-        new_entry.to_csv(CSV_FILE, mode='a', header=False, index=False)
-        return True, f"Welcome, {name}! Attendance marked."
-    except Exception as e:
-        return False, f"Error saving attendance: {e}"
+        # A single write to an O_APPEND file lands whole at the end, even with other
+        # sessions writing, so the log can't end up with interleaved rows
+        try:
+            fd = os.open(CSV_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, row.getvalue().encode())
+            finally:
+                os.close(fd)
+        except Exception as e:
+            return False, f"Error saving attendance: {e}"
+        seen.add((name, today_date))
+    return True, f"Welcome, {name}! Attendance marked."
 
 # --- MAIN UI ---
 
@@ -133,15 +364,21 @@ else:
 
 with st.sidebar.expander("🛠️ Debug Info"):
     if os.path.exists(IMG_FOLDER):
-        files = os.listdir(IMG_FOLDER)
+        files = [f for f in os.listdir(IMG_FOLDER) if f.lower().endswith(IMAGE_EXTS)]
         st.write(f"Images in buffer ({len(files)}):")
         st.write(files)
 
 menu = ["Check In", "Register New User", "View Logs"]
 choice = st.sidebar.selectbox("Menu", menu)
 
+# Only the recognition pages need dlib loaded
+if choice != "View Logs" and dlib_lacks_avx():
+    st.sidebar.warning("⚠️ dlib was built without AVX, face recognition will be slow. See requirements.txt.")
+
 if choice == "Register New User":
     st.subheader("📝 Register New Face")
+    import cv2
+    import face_worker
     
     # 1. Initialize State for Image BYTES
     if 'reg_img_bytes' not in st.session_state:
@@ -175,27 +412,20 @@ if choice == "Register New User":
                 status.write("1. Reading image data...")
                 # Decode from Session State Bytes
                 bytes_data = st.session_state.reg_img_bytes
-                cv2_img = cv2.imdecode(np.frombuffer(bytes_data, np.uint8), cv2.IMREAD_COLOR)
+                # Massive (4k) photos are scaled down while decoding
+                cv2_img = decode_image(bytes_data, REGISTER_MAX_WIDTH)
                 
                 h, w = cv2_img.shape[:2]
                 status.write(f"2. Image size: {w}x{h}")
                 
-                # Resize if massive (4k)
-                if w > 800:
-                    scale = 800 / w
-                    new_h = int(h * scale)
-                    cv2_img = cv2.resize(cv2_img, (800, new_h))
-                    status.write(f"3. Resized to {800}x{new_h}")
-                
                 rgb_img = cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB)
                 
-                status.write("4. Detecting face...")
-                # Use standard model first, it's more accurate than hog for static images
-                face_locations = face_recognition.face_locations(rgb_img)
+                status.write("3. Detecting face...")
+                face_locations = run_in_worker(face_worker.detect_faces, rgb_img)
                 
                 if len(face_locations) == 1:
-                    status.write("5. Encoding face...")
-                    face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+                    status.write("4. Encoding face...")
+                    face_encodings = run_in_worker(face_worker.encode_faces, rgb_img, face_locations)
                     
                     if face_encodings:
                         filename = f"{new_name.replace(' ', '_')}.jpg"
@@ -207,7 +437,7 @@ if choice == "Register New User":
                         
                         # Clear state
                         st.session_state.reg_img_bytes = None
-                        st.cache_data.clear() 
+                        load_registered_faces.clear()
                     else:
                         status.update(label="Encoding Error", state="error")
                         st.error("Face detected but could not be encoded. Try better lighting.")
@@ -224,9 +454,10 @@ if choice == "Register New User":
 
 elif choice == "Check In":
     st.subheader("📸 Face Recognition Check-In")
+    import cv2
     
     with st.spinner("Loading Face Database..."):
-        known_encodings, known_names = load_registered_faces()
+        known_encodings, known_sqnorms, known_names = load_registered_faces()
     
     if not known_names:
         st.warning("Database empty. Please register or check Debug Info.")
@@ -236,22 +467,24 @@ elif choice == "Check In":
         # Helper function to process the image bytes
         def process_checkin_image(img_bytes):
             try:
-                cv2_img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+                # Detection time grows with pixel count, so work on a small copy
+                cv2_img = decode_image(img_bytes, CHECKIN_MAX_WIDTH)
                 rgb_img = cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB)
                 
-                face_locations = face_recognition.face_locations(rgb_img)
-                face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+                face_locations, face_encodings = analyze_faces(img_bytes, rgb_img)
+                if not face_locations:
+                    st.image(cv2_img, channels="BGR")
+                    st.warning("No face detected in check-in photo.")
+                    return
                 
                 found_match = False
-                out_img = cv2_img.copy()
 
                 for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                    matches = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=0.5)
+                    best_index, best_d2 = find_best_match(known_encodings, known_sqnorms, face_encoding)
                     name = "Unknown"
 
-                    if True in matches:
-                        first_match_index = matches.index(True)
-                        name = known_names[first_match_index]
+                    if best_d2 <= MATCH_TOLERANCE ** 2:
+                        name = known_names[best_index]
                         found_match = True
                         success, msg = mark_attendance(name)
                         if success:
@@ -260,15 +493,14 @@ elif choice == "Check In":
                             st.info(msg)
 
                     color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                    cv2.rectangle(out_img, (left, top), (right, bottom), color, 2)
-                    cv2.putText(out_img, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                    # Draw straight onto the decoded photo, nothing else reads it after detection
+                    cv2.rectangle(cv2_img, (left, top), (right, bottom), color, 2)
+                    cv2.putText(cv2_img, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
-                st.image(out_img, channels="BGR")
+                st.image(cv2_img, channels="BGR")
                 
-                if not found_match and len(face_locations) > 0:
+                if not found_match:
                     st.warning("Face detected but not recognized.")
-                elif len(face_locations) == 0:
-                    st.warning("No face detected in check-in photo.")
             except Exception as e:
                 st.error(f"Error processing image: {e}")
 
@@ -288,11 +520,18 @@ elif choice == "Check In":
 
 elif choice == "View Logs":
     st.subheader("📊 Logs")
+    import pandas as pd
     if os.path.exists(CSV_FILE):
         try:
-            df = pd.read_csv(CSV_FILE)
-            st.dataframe(df)
-        except:
+            log_stat = os.stat(CSV_FILE)
+            header, rows = read_recent_logs(LOG_VIEW_ROWS, (log_stat.st_mtime_ns, log_stat.st_size))
+        except OSError:
+            header, rows = None, []
+        if not header:
             st.info("Empty logs.")
+        else:
+            if len(rows) == LOG_VIEW_ROWS:
+                st.caption(f"Showing the latest {LOG_VIEW_ROWS} check-ins.")
+            st.dataframe(pd.DataFrame(rows, columns=header))
     else:
         st.info("No logs.")
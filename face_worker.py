@@ -0,0 +1,70 @@
+"""
+Face detection and encoding for app.py, run inside a separate worker process.
+
+dlib's landmark predictor and face encoder keep hold of Python's GIL while they run.
+Running them on a Streamlit script thread would freeze every other session (and the
+server itself) until they finish, so app.py sends that work here instead.
+"""
+import numpy as np
+
+# Decoded images are converted to RGB into this buffer instead of a new array per image.
+# The worker runs one task at a time, so a single buffer is enough.
+_rgb_buf = None
+
+
+def init_worker():
+    """Loads face_recognition (and with it the dlib models) once, when the worker starts."""
+    import face_recognition  # noqa: F401
+
+
+def _to_rgb(bgr_img):
+    """A contiguous RGB copy of `bgr_img` in the re-used buffer."""
+    global _rgb_buf
+    import cv2
+
+    h, w = bgr_img.shape[:2]
+    if _rgb_buf is None or _rgb_buf.size < h * w * 3:
+        _rgb_buf = np.empty(h * w * 3, np.uint8)
+    # dlib rejects non-contiguous arrays, so reshape a prefix instead of slicing
+    return cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB, dst=_rgb_buf[:h * w * 3].reshape(h, w, 3))
+
+
+def detect_faces(rgb_img):
+    """
+    Face boxes as (top, right, bottom, left).
+    No upsampling: callers already hand us a resized photo, so doubling it only costs time.
+    """
+    import dlib
+    import face_recognition
+
+    # The CNN detector is only worth it on a GPU build of dlib, HOG is far faster on CPU
+    model = "cnn" if dlib.DLIB_USE_CUDA else "hog"
+    return face_recognition.face_locations(rgb_img, number_of_times_to_upsample=0, model=model)
+
+
+def encode_faces(rgb_img, face_locations):
+    """The 128-number encoding of each face box."""
+    import face_recognition
+
+    return face_recognition.face_encodings(rgb_img, face_locations, num_jitters=0, model="small")
+
+
+def analyze_faces(rgb_img):
+    """Returns (face_locations, face_encodings) for a check-in photo."""
+    face_locations = detect_faces(rgb_img)
+    # No faces means nothing to encode, don't even set up the encoder
+    face_encodings = encode_faces(rgb_img, face_locations) if face_locations else []
+    return face_locations, face_encodings
+
+
+def encode_first_face(bgr_img):
+    """Encodes the first face found in a decoded BGR image as float32, or returns None."""
+    import face_recognition
+
+    if bgr_img is None:
+        return None
+    try:
+        encodings = face_recognition.face_encodings(_to_rgb(bgr_img), num_jitters=0, model="small")
+    except Exception:
+        return None
+    return encodings[0].astype(np.float32) if encodings else None
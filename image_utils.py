@@ -0,0 +1,31 @@
+"""
+Small image helpers shared by main.py (webcam app) and app.py (Streamlit app).
+"""
+import cv2
+from PIL import Image
+
+
+def reduced_read_flag(source, max_width):
+    """
+    Picks the OpenCV read flag for a photo that only needs to be `max_width` pixels wide.
+    Phone photos are huge: a JPEG can be decoded directly at 1/2, 1/4 or 1/8 size,
+    which is much faster than decoding every pixel and uses far less memory.
+    Returns the flag for the smallest size that is still at least `max_width` wide.
+    `source` is a file path or a file-like object (e.g. io.BytesIO).
+    """
+    try:
+        # Only reads the header, not the pixels
+        with Image.open(source) as probe:
+            w, h = probe.size
+            # EXIF orientations 5-8 are rotated by 90 degrees when decoded
+            if probe.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                w, h = h, w
+    except Exception:
+        return cv2.IMREAD_COLOR # Not a photo PIL understands: let OpenCV try the normal way
+
+    for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                                 (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                 (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if w // factor >= max_width:
+            return reduced_flag
+    return cv2.IMREAD_COLOR
@@ -1,9 +1,15 @@
 import cv2 # The main library we use for Computer Vision (using the camera, drawing boxes)
 import numpy as np # Library for math operations (images are just big grids of numbers!)
 import face_recognition # The magic library that matches faces using AI
+import dlib # The C++ engine underneath face_recognition (we call it directly in the webcam loop)
+# Re-use the AI models face_recognition already loaded instead of loading them a second time
+from face_recognition.api import pose_predictor_68_point, pose_predictor_5_point, face_encoder
 import os # Helps us read files and folders from your computer
 from datetime import datetime # Helps us get the current date and time
 import time # Helps us measure time (used for delays or cooldowns)
+import atexit # Lets us run cleanup code when the program exits
+import pickle # Saves Python objects to a file (we use it to remember learned faces between runs)
+from image_utils import reduced_read_flag # Our own helper (image_utils.py), shared with app.py
 
 # ==========================================
 # 1. Configuration & Constants
@@ -12,16 +18,27 @@ import time # Helps us measure time (used for delays or cooldowns)
 
 PATH_IMAGES = 'Images_Attendance' # Folder where we store photos of Known People
 PATH_STRANGERS = 'Strangers' # Folder where we automatically save photos of strangers
+ATTENDANCE_FILE = 'Attendance.csv' # The attendance log (Name,Time,Date)
+PATH_ENCODINGS = 'encodings' # Folder where we save the learned faces so the next start is fast
+# Optional: OpenCV's YuNet face detector (much faster than the default HOG detector and uses all CPU cores).
+# Download face_detection_yunet_2023mar.onnx from the OpenCV Zoo and put it next to this file to enable it.
+PATH_YUNET_MODEL = 'face_detection_yunet_2023mar.onnx'
 
 # Create the folders if they don't exist yet (so the code doesn't crash)
 if not os.path.exists(PATH_IMAGES): os.makedirs(PATH_IMAGES)
 if not os.path.exists(PATH_STRANGERS): os.makedirs(PATH_STRANGERS)
+if not os.path.exists(PATH_ENCODINGS): os.makedirs(PATH_ENCODINGS)
 
 # LIVENESS Settings (To prevent someone from holding up a photo of you!)
 EYE_AR_THRESH = 0.25  # How "closed" the eye needs to be to count as a blink
 EYE_AR_CONSEC_FRAMES = 2 # How many frames (instants) the eye must be closed for
 LIVENESS_TIMEOUT = 5.0 # How many seconds "Verified" status lasts before asking to blink again
 STRANGER_COOLDOWN_SECONDS = 5.0 # Don't save 100 photos of the same stranger in 1 second. Wait 5s.
+MATCH_TOLERANCE = 0.6 # Max face distance that still counts as the same person (lower = stricter)
+TRAIN_MIN_WIDTH = 800 # Big training photos are loaded at 1/2, 1/4 or 1/8 size, but never narrower than this
+DETECT_EVERY_N_FRAMES = 3 # Finding faces is slow: do it every 3rd frame and re-use the boxes in between
+TRACK_IOU_THRESH = 0.5 # How much a new box must overlap an old one to count as the same face
+TRACK_MAX_MISSED_FRAMES = 15 # Forget a tracked face after it hasn't been seen for this many frames
 
 # Global Variables (Variables that change while the app is running)
 COUNTER = 0 # Counts how many frames eyes have been closed
@@ -35,57 +52,174 @@ last_attendance_status = {} # Dictionary to remember what status to show for eac
 # 2. Helper Functions
 # ==========================================
 
-def calculate_ear(eye_points):
+def calculate_ears(eyes):
     """
     Calculates "Eye Aspect Ratio" (EAR).
     Think of the eye as a polygon with 6 points. 
     This math formula checks if the polygon is "squashed" (closed eye) or "round" (open eye).
+    `eyes` holds the eye points of ALL faces in one array of shape (faces, 2 eyes, 6 points, x/y),
+    so every eye is measured in one go. Returns the average EAR of both eyes for each face.
     """
     # Vertical distances (Height of eye)
-    A = np.linalg.norm(eye_points[1] - eye_points[5])
-    B = np.linalg.norm(eye_points[2] - eye_points[4])
+    A = np.linalg.norm(eyes[:, :, 1] - eyes[:, :, 5], axis=2)
+    B = np.linalg.norm(eyes[:, :, 2] - eyes[:, :, 4], axis=2)
     # Horizontal distance (Width of eye)
-    C = np.linalg.norm(eye_points[0] - eye_points[3])
-    # The Ratio
+    C = np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=2)
+    # The Ratio, averaged over the left and right eye
     ear = (A + B) / (2.0 * C)
-    return ear
+    return ear.mean(axis=1)
+
+def detect_faces(bgr_img, rgb_img):
+    """
+    Finds faces and returns their boxes as (top, right, bottom, left), like face_recognition does.
+    Uses YuNet if its model file was found (it wants the BGR image), otherwise HOG (RGB image).
+    """
+    if yunet_detector is None:
+        return face_recognition.face_locations(rgb_img)
+
+    h, w = bgr_img.shape[:2]
+    yunet_detector.setInputSize((w, h))
+    _, faces = yunet_detector.detect(bgr_img)
+    if faces is None: return []
+
+    # YuNet gives (x, y, width, height, ...). Convert and keep the box inside the image.
+    face_locations = []
+    for x, y, fw, fh in faces[:, :4]:
+        left, top = max(int(x), 0), max(int(y), 0)
+        right, bottom = min(int(x + fw), w), min(int(y + fh), h)
+        face_locations.append((top, right, bottom, left))
+    return face_locations
+
+def get_face_shapes(rgb_img, face_locations):
+    """
+    Finds the 68 face landmarks ONCE per face. The result is used for two jobs:
+    - the eye points for the blink check (see get_eyes)
+    - the 128-number face encoding (see encode_faces)
+    (Calling face_encodings + face_landmarks separately would find landmarks twice.)
+    """
+    shapes = dlib.full_object_detections()
+    for top, right, bottom, left in face_locations:
+        shapes.append(pose_predictor_68_point(rgb_img, dlib.rectangle(left, top, right, bottom)))
+    return shapes
+
+def get_eyes(shapes):
+    """
+    Picks the eye points out of each face's landmarks: 36-41 are the left eye, 42-47 the right eye.
+    Returns them as one array of shape (faces, 2 eyes, 6 points, x/y) for calculate_ears.
+    """
+    eyes = []
+    for shape in shapes:
+        points = shape.parts()
+        eyes.append([(points[i].x, points[i].y) for i in range(36, 48)])
+    return np.array(eyes, dtype=np.float32).reshape(-1, 2, 6, 2)
+
+def encode_faces(rgb_img, track_ids, shapes):
+    """
+    Computes the 128-number encoding of every face in one batched call.
+    This is the slowest step, so it only runs for faces that don't have a name yet.
+    Returns the track ids together with their encodings.
+    """
+    encodings = [np.array(d) for d in face_encoder.compute_face_descriptor(rgb_img, shapes, 0)]
+    return track_ids, encodings
+
+def read_photo(path):
+    """Loads a training photo as BGR, shrunk while decoding (see image_utils.reduced_read_flag)."""
+    return cv2.imread(path, reduced_read_flag(path, TRAIN_MIN_WIDTH))
+
+def box_iou(a, b):
+    """
+    "Intersection over Union" of two (top, right, bottom, left) boxes.
+    1.0 means the boxes are identical, 0.0 means they don't touch at all.
+    """
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left: return 0.0
+    overlap = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return overlap / float(area_a + area_b - overlap)
+
+def update_tracks(tracks, face_locations, frame_no):
+    """
+    TRACKING: Links each new face box to the face we saw in (almost) the same spot before.
+    A face that is already recognised keeps its name, so we don't have to encode it again.
+    Faces that don't overlap any known track get a new, empty track.
+    Returns the track id of every box (same order as face_locations).
+    """
+    global next_track_id
+    face_track_ids = []
+    for box in face_locations:
+        best_id, best_iou = None, TRACK_IOU_THRESH
+        for track_id, track in tracks.items():
+            if track['last_seen'] == frame_no: continue # Already taken by another box this frame
+            iou = box_iou(box, track['bbox'])
+            if iou > best_iou:
+                best_id, best_iou = track_id, iou
+        if best_id is None:
+            # New face: nobody knows who it is yet ('name' None and no 'score')
+            best_id = next_track_id
+            next_track_id += 1
+            tracks[best_id] = {'name': None, 'score': None}
+        tracks[best_id]['bbox'] = box
+        tracks[best_id]['last_seen'] = frame_no
+        face_track_ids.append(best_id)
+
+    # Drop faces that have left the picture
+    for track_id in [t for t, track in tracks.items() if frame_no - track['last_seen'] > TRACK_MAX_MISSED_FRAMES]:
+        del tracks[track_id]
+    return face_track_ids
+
+def clean_name(filename):
+    """
+    Smart Name Cleaning
+    Turns "Obama_front.jpg" into just "Obama"
+    """
+    name_base = os.path.splitext(filename)[0]
+    if '_' in name_base:
+        parts = name_base.split('_')
+        last_part = parts[-1].lower()
+        # If filename ends with direction like 'Left', ignore that part
+        keywords = ['front', 'side', 'down', 'up', 'left', 'right', 'profile']
+        if any(k in last_part for k in keywords):
+            return "_".join(parts[:-1])
+    return name_base
+
+def load_attendance_log(filename):
+    """
+    Reads the attendance CSV ONCE at startup and returns a set of (name, date) pairs.
+    Checking "is this person already marked today?" in a set is instant, so
+    markAttendance never has to re-read the whole file (it runs on every frame!).
+    """
+    already_marked = set()
+    try:
+        with open(filename, 'r') as f:
+            for line in f:
+                entry = line.split(',')
+                # Lines with data look like: Name,Time,Date
+                if len(entry) >= 3:
+                    already_marked.add((entry[0], entry[2].strip()))
+    except OSError:
+        pass
+    return already_marked
 
 def markAttendance(name):
     """
-    This function opens the 'Attendance.csv' file and adds the person's name 
+    This function adds the person's name to the 'Attendance.csv' file
     if they haven't been marked present today.
     """
-    filename = 'Attendance.csv'
     now = datetime.now()
     today_str = now.strftime('%Y-%m-%d') # e.g. "2023-12-25"
     time_str = now.strftime('%H:%M:%S')  # e.g. "09:00:00"
 
-    # If file doesn't exist, create it with Headers
-    if not os.path.exists(filename):
-        with open(filename, 'w') as f:
-            f.write("Name,Time,Date")
-
-    # Read the file to see who is already here
-    try:
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-    except:
-        lines = []
-
-    # Check for duplicates
-    for line in lines:
-        entry = line.split(',')
-        # Check if the line has data and matches the Name + Today's Date
-        if len(entry) >= 3:
-            existing_name = entry[0]
-            existing_date = entry[2].strip()
-            if existing_name == name and existing_date == today_str:
-                return "ALREADY_LOGGED" 
+    # Check for duplicates (in memory, no file reading)
+    if (name, today_str) in already_marked:
+        return "ALREADY_LOGGED"
 
     # If we get here, they are not duplicated. Write them down!
     try:
-        with open(filename, 'a') as f: # 'a' means Append (add to end)
-            f.write(f'\n{name},{time_str},{today_str}')
+        attendance_file.write(f'\n{name},{time_str},{today_str}')
+        attendance_file.flush() # Push it to disk right away, so nothing is lost if the app crashes
+        already_marked.add((name, today_str))
         print(f"✅ CSV WRITE SUCCESS: {name} at {time_str}")
         return "MARKED"
     except Exception as e:
@@ -96,50 +230,115 @@ def markAttendance(name):
 # 3. Load Images (The "Training" Phase)
 # ==========================================
 # The app learns faces right when it starts up.
+# Learning a face is slow, so results are saved to a cache file. Each photo is stored
+# with its modification time and size: only photos that are new or changed get re-learned.
 known_face_encodings = []
 known_face_names = []
 print(f"Loading images from '{PATH_IMAGES}'...")
 
-# Loop through every file in the folder
-for cl in os.listdir(PATH_IMAGES):
-    if cl.lower().endswith(('.png', '.jpg', '.jpeg')):
-        img_path = f'{PATH_IMAGES}/{cl}'
-        curImg = cv2.imread(img_path)
-        if curImg is None: continue
-        
-        # Convert color layout from BGR (OpenCV) to RGB (Face Recognition)
-        curImg = cv2.cvtColor(curImg, cv2.COLOR_BGR2RGB)
-        
-        # Detect face and encode it
-        encodes = face_recognition.face_encodings(curImg)
-        
-        if len(encodes) > 0:
-            face_encoding = encodes[0] # Take the first face found
-            
-            # Smart Name Cleaning
-            # Turns "Obama_front.jpg" into just "Obama"
-            name_base = os.path.splitext(cl)[0]
-            if '_' in name_base:
-                parts = name_base.split('_')
-                last_part = parts[-1].lower()
-                # If filename ends with direction like 'Left', ignore that part
-                keywords = ['front', 'side', 'down', 'up', 'left', 'right', 'profile']
-                if any(k in last_part for k in keywords):
-                    name = "_".join(parts[:-1]) 
-                else:
-                    name = name_base
-            else:
-                name = name_base
-            
-            known_face_encodings.append(face_encoding)
-            known_face_names.append(name)
-            print(f"Encoded: {name}")
+cache_file = os.path.join(PATH_ENCODINGS, 'face_encodings.pkl')
+try:
+    with open(cache_file, 'rb') as f:
+        encoding_cache = pickle.load(f) # {filename: ((mtime, size), encoding or None)}
+except Exception:
+    encoding_cache = {} # No cache yet (first run) or it's unreadable: learn everything
+new_cache = {}
+cache_changed = False
+
+# os.scandir hands us each file's name and full path in a single pass over the folder
+with os.scandir(PATH_IMAGES) as entries:
+    image_files = [e for e in entries if e.is_file() and e.name.lower().endswith(('.png', '.jpg', '.jpeg'))]
+
+new_face_chips = [] # Cut-out, straightened faces from new photos, waiting to be encoded
+new_face_files = [] # ...and the photo each one came from
+
+for entry in image_files:
+    file_stat = entry.stat()
+    file_key = (file_stat.st_mtime, file_stat.st_size)
+    cached = encoding_cache.get(entry.name)
+
+    if cached is not None and cached[0] == file_key:
+        new_cache[entry.name] = cached # Learned on a previous run, nothing to do
+        continue
+
+    # Encoding stays None if the photo can't be read or has no face
+    new_cache[entry.name] = (file_key, None)
+    cache_changed = True
+    curImg = read_photo(entry.path)
+    if curImg is None: continue
+
+    # Convert color layout from BGR (OpenCV) to RGB (Face Recognition)
+    curImg = cv2.cvtColor(curImg, cv2.COLOR_BGR2RGB)
+
+    # Detect the face and find its landmarks (the small 5-point model is plenty for this)
+    face_locations = face_recognition.face_locations(curImg)
+    if len(face_locations) == 0: continue
+    top, right, bottom, left = face_locations[0] # Take the first face found
+    shape = pose_predictor_5_point(curImg, dlib.rectangle(left, top, right, bottom))
+
+    # Keep only the small 150x150 aligned face, not the whole (possibly huge) photo
+    new_face_chips.append(dlib.get_face_chip(curImg, shape, size=150, padding=0.25))
+    new_face_files.append(entry.name)
+
+# Encode ALL new faces in one batched call instead of one call per photo
+# (the 0 means no extra jittered copies; dlib treats 0 and 1 the same way)
+if new_face_chips:
+    print(f"Learning {len(new_face_chips)} new face(s)...")
+    new_encodings = face_encoder.compute_face_descriptor(new_face_chips, 0)
+    for filename, encoding in zip(new_face_files, new_encodings):
+        new_cache[filename] = (new_cache[filename][0], np.array(encoding))
+
+for entry in image_files:
+    face_encoding = new_cache[entry.name][1]
+    if face_encoding is None: continue
+
+    name = clean_name(entry.name)
+    known_face_encodings.append(face_encoding)
+    known_face_names.append(name)
+    print(f"Encoded: {name}")
+
+# Save the cache if anything was learned or a photo was deleted.
+# Write to a temporary file first, so a crash can never leave a half-written cache.
+if cache_changed or len(new_cache) != len(encoding_cache):
+    try:
+        with open(cache_file + '.tmp', 'wb') as f:
+            pickle.dump(new_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_file + '.tmp', cache_file)
+    except OSError as e:
+        print(f"Could not save encodings cache: {e}")
 
 print(f"\nsuccesfully loaded {len(known_face_encodings)} templates.")
 
+# Read who is already marked present (once), then keep the log open for adding new rows
+if not os.path.exists(ATTENDANCE_FILE):
+    # If file doesn't exist, create it with Headers
+    with open(ATTENDANCE_FILE, 'w') as f:
+        f.write("Name,Time,Date")
+already_marked = load_attendance_log(ATTENDANCE_FILE)
+attendance_file = open(ATTENDANCE_FILE, 'a') # 'a' means Append (add to end)
+atexit.register(attendance_file.close) # Close it properly when the program exits
+
+# Stack every known encoding into one table (one row of 128 numbers per person).
+# Now a new face can be compared against EVERYBODY with a single fast matrix operation
+# instead of looping over the list in Python.
+known_face_matrix = np.array(known_face_encodings, dtype=np.float32).reshape(-1, 128)
+known_face_sqnorms = (known_face_matrix * known_face_matrix).sum(axis=1) # Pre-computed once
+
 # ==========================================
 # 4. Main Webcam Loop (The "Action" Phase)
 # ==========================================
+# Let OpenCV use every CPU core (speeds up YuNet and the image resizing)
+cv2.setNumThreads(os.cpu_count() or 1)
+
+# Pick the face detector: YuNet if the model file is there, otherwise the built-in HOG detector
+yunet_detector = None
+if os.path.exists(PATH_YUNET_MODEL) and hasattr(cv2, 'FaceDetectorYN'):
+    # Arguments: model, config, input size (updated per frame), score threshold, NMS threshold, max faces
+    yunet_detector = cv2.FaceDetectorYN.create(PATH_YUNET_MODEL, "", (320, 320), 0.6, 0.3, 5000)
+    print("Face detector: YuNet (OpenCV DNN)")
+else:
+    print("Face detector: HOG (face_recognition)")
+
 # 0 usually means the built-in webcam.
 cap = cv2.VideoCapture(0)
 
@@ -148,20 +347,75 @@ print("  [q] Quit")
 print("  [o] OVERRIDE (Skip Blink & Mark Attendance)")
 print("  [c] CLEAR Liveness (Reset)")
 
+# SPEED: the slow steps don't run on every frame.
+# - Detection (finding faces) runs only every DETECT_EVERY_N_FRAMES frames.
+# - Every detected face is "tracked". Once a track has a name it is never encoded again,
+#   so a person standing still in front of the camera costs almost nothing.
+# - Encoding (recognising faces) runs at most once per detection, and only for faces
+#   that don't have a name yet.
+frame_count = 0
+facesCurFrame = [] # Face boxes from the latest detection
+faceTrackIds = [] # The track id of each box in facesCurFrame
+facesFullSize = [] # The boxes of facesCurFrame scaled back up to the full-size frame
+tracks = {} # track id -> {'bbox', 'name', 'score', 'last_seen'}
+next_track_id = 0
+newDetection = False # True on the frames where the detector just ran
+smallBGR = None # Half-size frame. Created once and then re-used every frame (no new memory per frame)
+imgS = None # The same half-size frame in RGB colors (also re-used)
+
 while True:
     # Read one frame/image from camera
     success, img = cap.read()
     if not success: break
 
     # OPTIMIZATION: Reduce image size by half to speed up processing
-    imgS = cv2.resize(img, (0, 0), None, 0.50, 0.50)
-    imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
+    # INTER_AREA is the fastest good-looking way to shrink, and it writes into our re-used buffer
+    h, w = img.shape[:2]
+    if smallBGR is None or smallBGR.shape[:2] != (h // 2, w // 2):
+        smallBGR = np.empty((h // 2, w // 2, 3), dtype=np.uint8)
+        imgS = np.empty_like(smallBGR)
+    cv2.resize(img, (w // 2, h // 2), dst=smallBGR, interpolation=cv2.INTER_AREA)
+    cv2.cvtColor(smallBGR, cv2.COLOR_BGR2RGB, dst=imgS)
 
-    # Detect faces in current frame
-    facesCurFrame = face_recognition.face_locations(imgS)
-    encodesCurFrame = face_recognition.face_encodings(imgS, facesCurFrame)
-    # Detect landmarks (eyes, nose, etc) for liveness
-    face_landmarks_list = face_recognition.face_landmarks(imgS, facesCurFrame)
+    # Detect faces, but only every few frames (re-use the last boxes otherwise)
+    if frame_count % DETECT_EVERY_N_FRAMES == 0:
+        facesCurFrame = detect_faces(smallBGR, imgS)
+        faceTrackIds = update_tracks(tracks, facesCurFrame, frame_count)
+        # Scale coordinates back up (x2) because we shrunk image by 0.5 earlier (all boxes at once)
+        facesFullSize = (np.array(facesCurFrame, dtype=np.int32).reshape(-1, 4) * 2).tolist()
+        newDetection = True
+    else:
+        newDetection = False
+    frame_count += 1
+
+    if facesCurFrame:
+        # Landmarks are cheap, so they run every frame: the blink check needs every frame
+        shapes = get_face_shapes(imgS, facesCurFrame)
+        eyesCurFrame = get_eyes(shapes)
+        # Encode only the faces we don't have a name for yet (once per detection)
+        if newDetection:
+            unknownIds, unknownShapes = [], dlib.full_object_detections()
+            for trackId, shape in zip(faceTrackIds, shapes):
+                if tracks[trackId]['name'] is None:
+                    unknownIds.append(trackId)
+                    unknownShapes.append(shape)
+            if unknownIds:
+                for trackId, encodeFace in zip(*encode_faces(imgS, unknownIds, unknownShapes)):
+                    # Compare Face against everyone at once: |k - q|^2 = |k|^2 - 2 k.q + |q|^2
+                    q = np.asarray(encodeFace, dtype=np.float32)
+                    faceDis = np.sqrt(np.maximum(known_face_sqnorms - 2.0 * known_face_matrix.dot(q) + q.dot(q), 0.0))
+
+                    # Best match is the one with smallest distance (nobody registered = no match)
+                    matchIndex = int(np.argmin(faceDis)) if len(faceDis) > 0 else -1
+                    matchScore = faceDis[matchIndex] if matchIndex >= 0 else 1.0
+
+                    # Lock the name onto the track. Strangers keep name None, so they get re-checked.
+                    if matchScore <= MATCH_TOLERANCE:
+                        tracks[trackId]['name'] = known_face_names[matchIndex].upper()
+                    tracks[trackId]['score'] = matchScore
+    else:
+        # Nobody in front of the camera, so skip the expensive AI steps
+        eyesCurFrame = np.empty((0, 2, 6, 2), dtype=np.float32)
 
     # Listen for Keyboard input
     key = cv2.waitKey(1) & 0xFF
@@ -176,13 +430,9 @@ while True:
 
     # LIVENESS LOGIC
     if not LIVENESS_VERIFIED:
-        # Check every face
-        for face_landmarks in face_landmarks_list:
-            leftEye = np.array(face_landmarks['left_eye'])
-            rightEye = np.array(face_landmarks['right_eye'])
+        # Check every face (the EAR of all faces is calculated at once)
+        for avgEAR in calculate_ears(eyesCurFrame).tolist():
             # Check blink
-            avgEAR = (calculate_ear(leftEye) + calculate_ear(rightEye)) / 2.0
-            
             if avgEAR < EYE_AR_THRESH:
                 COUNTER += 1 # Eyes are closed
             else:
@@ -205,22 +455,13 @@ while True:
         cv2.putText(img, "LIVENESS: PLEASE BLINK", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
         cv2.putText(img, "(or press 'o' to override)", (10, 55), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
 
-    # RECOGNITION LOGIC (Match faces)
-    for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
-        # Compare Face
-        matches = face_recognition.compare_faces(known_face_encodings, encodeFace)
-        faceDis = face_recognition.face_distance(known_face_encodings, encodeFace)
-        
-        # Best match is the one with smallest distance
-        matchIndex = np.argmin(faceDis)
-        matchScore = faceDis[matchIndex] if len(faceDis) > 0 else 1.0
-
-        # Scale coordinates back up (x2) because we shrunk image by 0.5 earlier
-        y1, x2, y2, x1 = faceLoc
-        y1, x2, y2, x1 = y1 * 2, x2 * 2, y2 * 2, x1 * 2
-
-        if matches[matchIndex]:
-            name = known_face_names[matchIndex].upper()
+    # RECOGNITION LOGIC (Show the result of every tracked face)
+    for trackId, (y1, x2, y2, x1) in zip(faceTrackIds, facesFullSize):
+        track = tracks[trackId]
+        if track['score'] is None: continue # Not encoded yet
+        name, matchScore = track['name'], track['score']
+
+        if name is not None:
             
             # Draw Green Box
             cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)